@@ -1,21 +1,121 @@
+from __future__ import annotations
+
+import select
 import socket
+from array import array
+from itertools import chain, islice
 from math import inf
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 from vector import Vector
 
+try:
+    import cython  # cython.* annotations are strings, they are only used when compiling
+    compiled = cython.compiled
+except ImportError:
+    compiled = False
+
+
+def no_jit(*_args, **_kwargs):
+    return lambda function: function
+
+
+if compiled:  # numba can't compile functions already compiled by Cython
+    njit = no_jit
+else:
+    try:
+        from numba import njit
+    except ImportError:  # BFS kernels will run as plain Python
+        njit = no_jit
+
+
+# cell type codes used by the array representation of the maze
+FLOOR, KEY, DOOR, EXIT, WALL = range(5)
+TYPE_CODES = {'Om': KEY, '{}': DOOR, '<>': EXIT, '##': WALL}
+NEIGHBOUR_DELTAS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+DIRECTIONS = {(0, 1): 'd', (0, -1): 'u', (1, 0): 'r', (-1, 0): 'l'}
+
 
 def split_by_length(array, size):
     return [array[z:z + size] for z in range(0, len(array), size)]
 
 
+def receive_message(sock: socket.socket, buffer: bytearray, timeout=0.5) -> str:
+    """
+    Reads a maze or any other message from the server, data following it is left in the buffer
+    Mazes have no delimiter, a maze is complete when a row of walls equal to its first row is received.
+    Other messages (e.g. the flag) are returned up to their last complete line, or as they are
+    if nothing more arrives in timeout seconds or the connection is closed
+    :return: decoded message, '' if the connection is closed
+    """
+    while True:
+        del buffer[:len(buffer) - len(buffer.lstrip(b'\r\n'))]
+        if buffer and not buffer.startswith(b'#'):
+            end = buffer.rfind(b'\n')
+            if end != -1:
+                message = bytes(buffer[:end])
+                del buffer[:end + 1]
+                return message.decode()
+            if not select.select([sock], [], [], timeout)[0]:
+                break  # the server waits for us, the message is complete
+        else:
+            rows = buffer.split(b'\n')
+            for z in range(2, len(rows)):
+                if rows[z].startswith(rows[0]) and not rows[0].strip(b'#'):
+                    message = b'\n'.join(rows[:z]) + b'\n' + rows[0]
+                    del buffer[:len(message)]
+                    return message.decode()
+        data = sock.recv(65536)
+        if not data:
+            break
+        buffer += data
+    message = bytes(buffer)
+    buffer.clear()
+    return message.decode()
+
+
+@njit(cache=True)
+def bfs_kernel(indptr: cython.int[:], adj: cython.int[:], types: cython.schar[:], source: cython.int,
+               visited: cython.int[:], epoch: cython.int,
+               shortest_path_from: cython.int[:], queue: cython.int[:]) -> cython.int:
+    """
+    BFS over the CSR arrays visiting everything reachable from source
+    Doors are visited, but passing through them is only allowed from the source
+    Visited vertices are marked with epoch which has to differ from the marks of previous searches,
+    shortest_path_from is valid only for visited vertices
+    :return: number of visited vertices, they are queue[:returned value]
+    """
+    head: cython.int = 0
+    tail: cython.int = 1
+    current: cython.int
+    neighbour: cython.int
+    z: cython.int
+    queue[0] = source
+    visited[source] = epoch
+    while head < tail:
+        current = queue[head]
+        head += 1
+        if types[current] == DOOR and current != source:
+            continue
+        for z in range(indptr[current], indptr[current + 1]):
+            neighbour = adj[z]
+            if visited[neighbour] != epoch:
+                visited[neighbour] = epoch
+                shortest_path_from[neighbour] = current
+                queue[tail] = neighbour
+                tail += 1
+    return tail
+
+
 class Vertex:
-    def __init__(self, position, type_=None):
+    __slots__ = ('pos', 'pos_x', 'pos_y', 'idx', 'type', 'neighbours')
+
+    def __init__(self, position, type_=None, idx=-1):
         self.pos = Vector(position)
+        self.pos_x, self.pos_y = self.pos.x, self.pos.y
+        self.idx = idx  # y * width + x, index in Maze.vertices_flat
         self.type = type_
-        self.distance = inf
         self.neighbours: List[Vertex] = []
-        self.shortest_path_from: Optional[Vertex] = None
 
     def __str__(self):
         return f'{self.pos} <{self.type}>'
@@ -27,141 +127,197 @@ class Maze:
     def __init__(self, maze: List[List[str]]):
         assert all(len(x) == len(maze[0]) for x in maze)
         self.size = Vector(len(maze[0]), len(maze))
-        self.start = None
+        # checkpoints reachable from a vertex (they depend only on that vertex), a bit vector over _checkpoints
+        self._avail_bits: Dict[Vertex, int] = {}
+        # shortest paths from explored vertices to checkpoints available from them
+        self._pair_path: Dict[Tuple[int, int], Tuple[Vertex, ...]] = {}
 
-        self.maze: List[List[Optional[Vertex]]] = [[None] * self.size.x for _ in range(self.size.y)]
+        width, height = self.size.x, self.size.y
+        self.vertices_flat: List[Optional[Vertex]] = [None] * (width * height)
         for y, row in enumerate(maze):
             for x, cell in enumerate(row):
                 if cell == '##':
                     continue
-                self.maze[y][x] = Vertex(Vector(x, y), cell)
+                idx = y * width + x
+                self.vertices_flat[idx] = Vertex(Vector(x, y), cell, idx)
+        self.maze: List[List[Optional[Vertex]]] = split_by_length(self.vertices_flat, width)
+        self.start = self.maze[1][1]
+        self._vertices: Tuple[Vertex, ...] = tuple(vertex for vertex in self.vertices_flat if vertex is not None)
 
-        for row in self.maze:
-            for vertex in row:
-                if vertex is None:
+        for vertex in self.vertices_flat:
+            if vertex is None:
+                continue
+            idx = vertex.idx
+            x, y = idx % width, idx // width
+            for dx, dy in NEIGHBOUR_DELTAS:
+                if not (0 <= x + dx < width and 0 <= y + dy < height):
                     continue
-                for neighbour in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                    neighbour: Vector = vertex.pos + neighbour
-                    neighbour: Optional[Vertex] = self.maze[neighbour.y][neighbour.x]
-                    if neighbour is not None:
-                        vertex.neighbours.append(neighbour)
+                neighbour = self.vertices_flat[idx + dy * width + dx]
+                if neighbour is not None:
+                    vertex.neighbours.append(neighbour)
+
+        # CSR adjacency: neighbours of vertex z are _adj[_indptr[z]:_indptr[z + 1]]
+        self._indptr = array('i', [0])
+        self._adj = array('i')
+        self._types = array('b')
+        for z, cell in enumerate(cell for row in maze for cell in row):
+            if self.vertices_flat[z] is not None:
+                self._adj.extend(neighbour.idx for neighbour in self.vertices_flat[z].neighbours)
+            self._indptr.append(len(self._adj))
+            self._types.append(TYPE_CODES.get(cell, FLOOR))
+
+        # BFS buffers, allocated once; a vertex is visited by the current BFS if _visited[vertex] == _epoch,
+        # so they never have to be reset
+        self._epoch = 0
+        self._visited = array('i', [0]) * len(self._types)
+        self._shortest_path_from = array('i', self._visited)
+        self._queue = array('i', self._visited)
+
+        checkpoints = [vertex for vertex in self._vertices if vertex.type in ['<>', 'Om', '{}']]
+        self._checkpoints = checkpoints
+        self._checkpoint_bits: Dict[Vertex, int] = {vertex: 1 << z for z, vertex in enumerate(checkpoints)}
+        self._exits = [vertex for vertex in checkpoints if vertex.type == '<>']
+        for vertex in [self.start] + checkpoints:
+            self._explore_from(vertex)
 
-    def vertices(self):
-        return (vertex for row in self.maze for vertex in row if vertex is not None)
+    def vertices(self) -> Tuple[Vertex, ...]:
+        return self._vertices
 
     def solve(self):
-        start = self.maze[1][1]
-        plans = self.paths_to_exit([start])
+        plans = self.paths_to_exit([self.start])
         paths = [self.calculate_plan_path(plan) for plan in plans]
         the_path = min(paths, key=lambda x: len(x))
-        ans = ''
+        ans = []
         for z in range(len(the_path) - 1):
-            direction = the_path[z + 1].pos - the_path[z].pos
-            if direction.x == 0:
-                ans += 'd' if direction.y == 1 else 'u'
-            else:
-                ans += 'r' if direction.x == 1 else 'l'
-        return ans
+            dx = the_path[z + 1].pos_x - the_path[z].pos_x
+            dy = the_path[z + 1].pos_y - the_path[z].pos_y
+            ans.append(DIRECTIONS[dx, dy])
+        return ''.join(ans)
 
     def paths_to_exit(self, path: List[Vertex], keys=0) -> List[List[Vertex]]:
+        """
+        Depth-first search over checkpoint routes starting with path.
+        A route state is (checkpoint, keys, visited checkpoints), routes reaching
+        an already seen state with no shorter length are pruned as well as routes
+        which can't beat the shortest route to the exit found so far
+        :return: routes to the exit, each one shorter than the previous
+        """
         routes = []
-        # find all checkpoints available from the end of the path
-        available = self.available_from(path[-1])
-        # remove those we already visited
-        available.difference_update(path)
-        for node in available:
-            new_keys = keys
-            if node.type == 'Om':
-                new_keys += 1
-            elif node.type == '{}':
-                new_keys -= 1
-            if new_keys < 0:
-                continue  # this route has more doors than keys
-
-            new_path = path + [node]
-            if node.type == '<>':
-                routes.append(new_path)
-            else:
-                subroutes = self.paths_to_exit(new_path, new_keys)
-                routes.extend(subroutes)
+        mask = 0
+        for vertex in path:
+            mask |= self._checkpoint_bits.get(vertex, 0)
+        length = sum(len(self.checkpoint_path(a, b)) - 1 for a, b in zip(path, path[1:]))
+        best_length = inf
+        best_to_state: Dict[Tuple[int, int, int], int] = {}
+
+        stack = [(path, keys, mask, length)]
+        while stack:
+            path, keys, mask, length = stack.pop()
+            # find all checkpoints available from the end of the path we haven't visited yet
+            available = self._available_bits(path[-1]) & ~mask
+            while available:
+                bit = available & -available  # lowest set bit
+                available ^= bit
+                node = self._checkpoints[bit.bit_length() - 1]
+                new_keys = keys
+                if node.type == 'Om':
+                    new_keys += 1
+                elif node.type == '{}':
+                    new_keys -= 1
+                if new_keys < 0:
+                    continue  # this route has more doors than keys
+
+                new_length = length + len(self.checkpoint_path(path[-1], node)) - 1
+                if new_length + self._distance_to_exit_estimate(node) >= best_length:
+                    continue
+                state = (node.idx, new_keys, mask | bit)
+                if state in best_to_state and best_to_state[state] <= new_length:
+                    continue
+                best_to_state[state] = new_length
+
+                new_path = path + [node]
+                if node.type == '<>':
+                    best_length = new_length
+                    routes.append(new_path)
+                else:
+                    stack.append((new_path, new_keys, mask | bit, new_length))
         return routes
 
+    def _distance_to_exit_estimate(self, vertex: Vertex) -> int:
+        """
+        Manhattan distance to the nearest exit, never greater than the real one
+        """
+        return min((abs(vertex.pos_x - exit_.pos_x) + abs(vertex.pos_y - exit_.pos_y) for exit_ in self._exits),
+                   default=0)
+
     def available_from(self, start: Vertex) -> Set[Vertex]:
-        for vertex in self.vertices():
-            vertex.distance = inf
-
-        available = set()
-        queue: List[Vertex] = [start]
-        start.distance = 0
-
-        while queue:
-            current = queue.pop(0)
-            if current.type in ['<>', 'Om', '{}']:
-                available.add(current)
-            if current.type == '{}' and current is not start:
+        available = self._available_bits(start)
+        return {checkpoint for z, checkpoint in enumerate(self._checkpoints) if available >> z & 1}
+
+    def _available_bits(self, start: Vertex) -> int:
+        if start not in self._avail_bits:
+            self._explore_from(start)
+        return self._avail_bits[start]
+
+    def checkpoint_path(self, source: Vertex, dest: Vertex) -> Tuple[Vertex, ...]:
+        """
+        Shortest path from source to the checkpoint dest available from it
+        :return: tuple of vertices including both source and dest
+        """
+        self._available_bits(source)
+        return self._pair_path[source.idx, dest.idx]
+
+    def _explore_from(self, start: Vertex):
+        """
+        Runs BFS from start and saves checkpoints available from it with their shortest paths
+        """
+        self._epoch += 1
+        visited = bfs_kernel(self._indptr, self._adj, self._types, start.idx, self._visited, self._epoch,
+                             self._shortest_path_from, self._queue)
+        available_bits = 0
+        for idx in self._queue[1:visited]:
+            if self._types[idx] == FLOOR:
                 continue
-            for neighbour in current.neighbours:
-                if neighbour.distance == inf:
-                    neighbour.distance = 0
-                    queue.append(neighbour)
-        available.discard(start)
-        return available
+            path = []
+            current = idx
+            while current != start.idx:
+                path.append(self.vertices_flat[current])
+                current = self._shortest_path_from[current]
+            path.append(start)
+            self._pair_path[start.idx, idx] = tuple(reversed(path))
+            available_bits |= self._checkpoint_bits[self.vertices_flat[idx]]
+        self._avail_bits[start] = available_bits
 
     def calculate_plan_path(self, plan) -> List[Vertex]:
-        paths = []
-        for z in range(len(plan) - 1):
-            paths.append(self.bfs(plan[z], plan[z + 1]))
-        for path in paths[1:]:
-            path.pop(0)
-        return sum(paths, [])
-
-    def bfs(self, source: Vertex, dest: Vertex) -> List[Vertex]:
-        vertices = [source]
-        for vertex in self.vertices():
-            vertex.distance = inf
-            vertex.shortest_path_from = None
-        source.distance = 0
-
-        while vertices:
-            vertex = vertices.pop(0)
-            if vertex is dest:
-                break
-
-            for neighbour in vertex.neighbours:
-                if neighbour.type == '{}' and neighbour is not dest:
-                    continue
-                if neighbour.distance == inf:
-                    neighbour.distance = vertex.distance + 1
-                    neighbour.shortest_path_from = vertex
-                    vertices.append(neighbour)
-
-        path = []
-        current_vertex = dest
-        while current_vertex.shortest_path_from is not None:
-            path.append(current_vertex)
-            current_vertex = current_vertex.shortest_path_from
-        if path:
-            path.append(current_vertex)
-        return path[::-1]
-
-
-sock = socket.socket()
-sock.connect(('tasks.open.kksctf.ru', 31397))
-sock.recv(100000)  # skip initial '\n\n'
-
-while True:
-    s = sock.recv(100000).decode()
-    if s == '':
-        break
-    print(s)
-    if s.startswith('Gratz'):
-        break
-
-    maze = s.split('\n')
-    maze = [split_by_length(x, 2) for x in maze]
-    maze = Maze(maze)
-    ans = maze.solve() + '\r\n'
-    print(ans)
-    sock.send(ans.encode())
-
-sock.close()
+        paths = [self.checkpoint_path(plan[z], plan[z + 1]) for z in range(len(plan) - 1)]
+        if not paths:
+            return []
+        # every path starts where the previous one ends, skip the first vertex of all paths but the first one
+        return list(chain(paths[0], chain.from_iterable(islice(path, 1, None) for path in paths[1:])))
+
+
+def main():
+    sock = socket.socket()
+    sock.connect(('tasks.open.kksctf.ru', 31397))
+    buffer = bytearray()
+
+    while True:
+        s = receive_message(sock, buffer)
+        if s == '':
+            break
+        print(s)
+        if s.startswith('Gratz'):
+            break
+
+        maze = s.split('\n')
+        maze = [split_by_length(x, 2) for x in maze]
+        maze = Maze(maze)
+        ans = maze.solve() + '\r\n'
+        print(ans)
+        sock.send(ans.encode())
+
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+# optional, compiles the solver in place: python setup.py build_ext --inplace
+setup(
+    name='a_maze_ing',
+    ext_modules=cythonize(['maze.py', 'vector.py'], compiler_directives={'language_level': 3}),
+)
@@ -0,0 +1,106 @@
+import socket
+import threading
+import unittest
+
+from maze import Maze, receive_message, split_by_length
+
+MAZE = '\n'.join([
+    '##########',
+    '##:(Om  ##',
+    '####{}####',
+    '##<>    ##',
+    '##########',
+])
+OTHER_MAZE = '\n'.join([
+    '########',
+    '##:(<>##',
+    '########',
+])
+FLAG = 'Gratz! kks{flag}'
+# the nearest key is a dead end one step down, the key on the way to the door is shorter overall
+GREEDY_TRAP_MAZE = '\n'.join([
+    '################',
+    '##:(    Om{}<>##',
+    '##Om############',
+    '################',
+])
+# the second key is behind the first door
+TWO_DOORS_MAZE = '\n'.join([
+    '################',
+    '##:(  {}Om{}<>##',
+    '##Om############',
+    '################',
+])
+
+
+class ReceiveMessageTest(unittest.TestCase):
+    def receive_all(self, data: bytes, cuts):
+        """
+        Sends data split at cuts through a socket pair and returns all messages received
+        """
+        server, client = socket.socketpair()
+
+        def send():
+            bounds = [0, *cuts, len(data)]
+            for start, end in zip(bounds, bounds[1:]):
+                server.sendall(data[start:end])
+            server.close()
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        buffer = bytearray()
+        messages = []
+        while True:
+            message = receive_message(client, buffer)
+            if message == '':
+                break
+            messages.append(message)
+        sender.join()
+        client.close()
+        return messages
+
+    def test_split_mazes(self):
+        data = f'\n\n{MAZE}\n{OTHER_MAZE}\n{FLAG}'.encode()
+        for cut in range(1, len(data)):
+            with self.subTest(cut=cut):
+                self.assertEqual(self.receive_all(data, [cut]), [MAZE, OTHER_MAZE, FLAG])
+
+    def test_merged_mazes(self):
+        data = f'{MAZE}{OTHER_MAZE}'.encode()
+        self.assertEqual(self.receive_all(data, []), [MAZE, OTHER_MAZE])
+
+    def test_split_trailing_message(self):
+        data = f'{MAZE}\n{FLAG}\n'.encode()
+        for cut in range(len(MAZE) + 1, len(data)):
+            with self.subTest(cut=cut):
+                self.assertEqual(self.receive_all(data, [cut]), [MAZE, FLAG])
+
+    def test_trailing_message_on_open_connection(self):
+        server, client = socket.socketpair()
+        server.sendall(f'{MAZE}\n{FLAG}'.encode())
+        buffer = bytearray()
+        self.assertEqual(receive_message(client, buffer, timeout=0.1), MAZE)
+        self.assertEqual(receive_message(client, buffer, timeout=0.1), FLAG)
+        server.close()
+        client.close()
+
+
+class SolveTest(unittest.TestCase):
+    def solve(self, maze: str) -> str:
+        return Maze([split_by_length(row, 2) for row in maze.split('\n')]).solve()
+
+    def test_no_doors(self):
+        self.assertEqual(self.solve(OTHER_MAZE), 'r')
+
+    def test_key_before_door(self):
+        self.assertEqual(self.solve(MAZE), 'rddl')
+
+    def test_nearest_key_is_not_taken(self):
+        self.assertEqual(self.solve(GREEDY_TRAP_MAZE), 'rrrrr')
+
+    def test_key_behind_door(self):
+        self.assertEqual(self.solve(TWO_DOORS_MAZE), 'durrrrr')
+
+
+if __name__ == '__main__':
+    unittest.main()
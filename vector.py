@@ -27,8 +27,9 @@ def _reflect(operation):
     return reflected
 
 
-# noinspection PyAttributeOutsideInit
 class Vector:
+    __slots__ = ('x', 'y')
+
     @overload
     def __init__(self):
         """
@@ -146,7 +147,8 @@ class Vector:
         >>> Vector(5, 5) + (2, 3)
         <Vector 7, 8>
         """
-        other = _convert_other(other)
+        if other.__class__ is not Vector:
+            other = _convert_other(other)
         return Vector(self.x + other.x, self.y + other.y)
 
     __radd__ = __add__
@@ -169,7 +171,8 @@ class Vector:
         >>> Vector(5, 5) - (2, 3)
         <Vector 3, 2>
         """
-        other = _convert_other(other)
+        if other.__class__ is not Vector:
+            other = _convert_other(other)
         return Vector(self.x - other.x, self.y - other.y)
 
     __rsub__ = _reflect(operator.sub)
@@ -194,7 +197,8 @@ class Vector:
         >>> Vector(5, 5) * (2, 3)
         <Vector 10, 15>
         """
-        other = _convert_other(other)
+        if other.__class__ is not Vector:
+            other = _convert_other(other)
         return Vector(self.x * other.x, self.y * other.y)
 
     __rmul__ = __mul__
@@ -586,7 +590,8 @@ class Vector:
         >>> Vector(1.1, 1) == Vector(1, 1)
         False
         """
-        other = _convert_other(other)
+        if other.__class__ is not Vector:
+            other = _convert_other(other)
         return self.x == other.x and self.y == other.y
 
     def __ne__(self, other) -> bool: